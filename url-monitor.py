@@ -10,14 +10,46 @@ import sys
 sys.stdout.reconfigure(encoding='utf-8')
 
 import os
+import ssl
+import re
+import signal
+import argparse
+import threading
+import functools
+import random
+import time
+import ipaddress
+import html
+import codecs
 import json
 import requests
 import shlex
 import urllib3
 import logging
-from bs4 import BeautifulSoup
+import queue
+import atexit
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_CA_BUNDLE_PATH
 from urllib.parse import urlparse
 
+# orjson is optional; fall back to the standard library if it is not installed
+try:
+    import orjson
+
+    def load_json(data):
+        return orjson.loads(data)
+
+    def dump_json(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    def load_json(data):
+        return json.loads(data)
+
+    def dump_json(obj):
+        return json.dumps(obj, indent=2).encode("utf-8")
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Configurations
@@ -25,119 +57,392 @@ CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "url-moni
 FAILURE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "failures.json")
 FAILURE_THRESHOLD = 5
 TIMEOUT = 10
+PROBE_TIMEOUT = 3
+FULL_CHECK_INTERVAL = 600
 RETRY_COUNT = 2
+RETRY_BACKOFF_BASE = 0.5
+RETRY_BACKOFF_CAP = 8
+RETRY_JITTER = 0.2
 LOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "url-monitor.log")
+MAX_WORKERS = 16
+POOL_SIZE = 32
+CHUNK_SIZE = 16384
+MAX_CONTENT_BYTES = 2 * 1024 * 1024
+
+# Returned by check_url in place of the body when the server answers 304
+NOT_MODIFIED = object()
+
+# Markup skipped when searching page text for a keyword
+UNCLOSED_BLOCKS = [("<!--", "-->"), ("<script", "</script"), ("<style", "</style")]
+# A '<' only starts a tag when followed by a tag name, '/', '!' or '?', as in html.parser
+TAG_RE = re.compile(r"<!--.*?-->|<(script|style)\b.*?</\1\s*>|<[a-zA-Z/!?][^>]*>", re.DOTALL | re.IGNORECASE)
 
 # Pushover credentials
 PUSHOVER_TOKEN = "xxx"
 PUSHOVER_USER = "xxx"
+PUSHOVER_MAX_LENGTH = 1024
 
-# Set up logging
+# Set up logging; worker threads only enqueue records, a background listener writes file and console
+LOG_QUEUE = queue.Queue(-1)
+log_file_handler = logging.FileHandler(LOG_FILE)
+log_file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+log_console_handler = logging.StreamHandler(sys.stdout)
+log_console_handler.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+LOG_LISTENER = QueueListener(LOG_QUEUE, log_file_handler, log_console_handler)
+log_queue_handler = QueueHandler(LOG_QUEUE)
+log_queue_handler.setFormatter(logging.Formatter("%(message)s"))
 logging.basicConfig(
-    filename=LOG_FILE,
     level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[log_queue_handler],
     force=True
 )
+LOG_LISTENER.start()
+atexit.register(LOG_LISTENER.stop)
+
+class SSLContextAdapter(HTTPAdapter):
+    # Hands one prebuilt SSLContext to every pooled connection instead of building one per connection
+    def __init__(self, ssl_context, ca_bundle=None, **kwargs):
+        self.ssl_context = ssl_context
+        self.ca_bundle = ca_bundle
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["ssl_context"] = self.ssl_context
+        super().init_poolmanager(*args, **kwargs)
+
+    def cert_verify(self, conn, url, verify, cert):
+        super().cert_verify(conn, url, verify, cert)
+        if self.ca_bundle and verify in [True, self.ca_bundle]:
+            # The CA bundle is already loaded into ssl_context; leaving it set here
+            # would make urllib3 reload it for every new connection
+            conn.ca_certs = None
+            conn.ca_cert_dir = None
+
+# Same trust store requests would pick (REQUESTS_CA_BUNDLE/CURL_CA_BUNDLE or certifi), loaded once
+CA_BUNDLE = os.environ.get("REQUESTS_CA_BUNDLE") or os.environ.get("CURL_CA_BUNDLE") or DEFAULT_CA_BUNDLE_PATH
+if os.path.isdir(CA_BUNDLE):
+    VERIFY_SSL_CONTEXT = ssl.create_default_context(capath=CA_BUNDLE)
+else:
+    VERIFY_SSL_CONTEXT = ssl.create_default_context(cafile=CA_BUNDLE)
+NO_VERIFY_SSL_CONTEXT = ssl.create_default_context()
+NO_VERIFY_SSL_CONTEXT.check_hostname = False
+NO_VERIFY_SSL_CONTEXT.verify_mode = ssl.CERT_NONE
+
+# Shared HTTP sessions, reuse connections for checks and notifications;
+# internal hosts get their own session so the two contexts are never mixed
+SESSION = requests.Session()
+INTERNAL_SESSION = requests.Session()
+
+def mount_adapters(pool_size):
+    # Keep at least one pooled connection per worker so threads never block on the pool
+    for session, ssl_context, ca_bundle in [(SESSION, VERIFY_SSL_CONTEXT, CA_BUNDLE), (INTERNAL_SESSION, NO_VERIFY_SSL_CONTEXT, None)]:
+        session.mount("https://", SSLContextAdapter(ssl_context, ca_bundle, pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0))
+        session.mount("http://", HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0))
+
+mount_adapters(POOL_SIZE)
+
+# Last state written to (or read from) FAILURE_FILE, used to skip no-op writes
+saved_failures = None
 
 def load_failures():
+    global saved_failures
     if os.path.exists(FAILURE_FILE):
         try:
-            with open(FAILURE_FILE, "r") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
+            with open(FAILURE_FILE, "rb") as f:
+                failures = load_json(f.read())
+            saved_failures = dump_json(failures)
+            return failures
+        except (ValueError, IOError):
             logging.error("Failed to parse failures.json, resetting...")
-            print("[ERROR] Corrupted failures.json, resetting failure tracking.")
             return {}
     return {}
 
 def save_failures(failures):
+    global saved_failures
+    data = dump_json(failures)
+    if data == saved_failures:
+        return
+    tmp_file = FAILURE_FILE + ".tmp"
     try:
-        with open(FAILURE_FILE, "w") as f:
-            json.dump(failures, f, indent=2)
+        # Write a temporary file and swap it in so a crash never leaves a truncated file
+        with open(tmp_file, "wb") as f:
+            f.write(data)
+        os.replace(tmp_file, FAILURE_FILE)
+        saved_failures = data
     except IOError as e:
         logging.error(f"Failed to save failures.json: {e}")
-        print(f"[ERROR] Unable to save failure data: {e}")
 
+@functools.lru_cache(maxsize=None)
 def is_internal_ip(url):
-    parsed_url = urlparse(url)
-    hostname = parsed_url.hostname
-    return hostname and hostname.startswith("192.168.178.")
+    hostname = urlparse(url).hostname or ""
+    try:
+        return ipaddress.ip_address(hostname).is_private
+    except ValueError:
+        return hostname.endswith(".local")
 
 def load_urls():
-    urls = []
-    if not os.path.exists(CONFIG_FILE):
+    try:
+        mtime = os.stat(CONFIG_FILE).st_mtime_ns
+    except OSError:
         logging.error(f"Config file {CONFIG_FILE} not found.")
-        print(f"[ERROR] Config file {CONFIG_FILE} not found.")
-        return urls
+        return []
+    return list(parse_config(CONFIG_FILE, mtime))
+
+def strip_comment(line):
+    # A '#' starts a trailing comment only outside quotes and at the start of a word,
+    # so URL fragments like https://host/#anchor are kept
+    quote = None
+    for i, char in enumerate(line):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char == "#" and (i == 0 or line[i - 1].isspace()):
+            return line[:i]
+    return line
+
+@functools.lru_cache(maxsize=1)
+def parse_config(path, mtime):
+    # mtime is part of the cache key, so the file is only re-parsed after it changes
+    urls = []
     try:
-        with open(CONFIG_FILE, "r") as f:
+        with open(path, "r") as f:
             for line in f:
                 line = line.strip()
                 if line and not line.startswith("#"):
-                    parts = shlex.split(line)
+                    parts = shlex.split(strip_comment(line))
                     if len(parts) < 2:
                         logging.warning(f"Invalid line in config: {line}")
-                        print(f"[WARNING] Skipping invalid config line: {line}")
                         continue
                     description, url = parts[:2]
-                    keyword = parts[2] if len(parts) > 2 else None
+                    # Several keywords may follow the URL; all of them must be present
+                    keyword = parts[2] if len(parts) == 3 else parts[2:] or None
                     urls.append({"description": description, "url": url, "keyword": keyword})
     except Exception as e:
         logging.error(f"Error loading config: {e}")
-        print(f"[ERROR] Could not load config file: {e}")
     return urls
 
-def check_url(url):
+def as_keywords(keyword):
+    return [keyword] if isinstance(keyword, str) else keyword
+
+def closed_markup_prefix(content):
+    # A partially read page may end inside a tag, script, style or comment;
+    # drop a trailing partial tag and refuse prefixes with a block still open
+    cut = content.rfind("<")
+    if cut != -1 and content.find(">", cut) == -1:
+        content = content[:cut]
+    lowered = content.lower()
+    for opening, closing in UNCLOSED_BLOCKS:
+        start = lowered.rfind(opening)
+        if start != -1 and lowered.find(closing, start) == -1:
+            return None
+    return content
+
+def response_encoding(response):
+    # Unknown or non-text charsets fall back to utf-8 instead of aborting the check
+    encoding = response.encoding or "utf-8"
+    try:
+        encoding = codecs.lookup(encoding).name
+        # Non-text codecs such as rot13 are found by lookup but cannot decode bytes
+        b"a".decode(encoding)
+    except LookupError:
+        return "utf-8"
+    return encoding
+
+def read_content(response, keyword):
+    # Read the body in chunks and stop as soon as every keyword is confirmed
+    needles = {k.lower().encode("utf-8") for k in as_keywords(keyword)}
+    tail_length = max(len(needle) for needle in needles) - 1
+    encoding = response_encoding(response)
+    body = bytearray()
+    tail = b""
+    seen = set()
+    confirm = True
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        body += chunk
+        window = (tail + chunk).lower()
+        tail = window[-tail_length:] if tail_length else b""
+        hits = {needle for needle in needles if needle in window}
+        seen |= hits
+        # Only confirm on a fresh raw hit, and strip the body at most once per page
+        if confirm and hits and len(seen) == len(needles):
+            content_type = response.headers.get("Content-Type")
+            content = body.decode(encoding, errors="replace")
+            if is_markup(content_type):
+                content = closed_markup_prefix(content)
+            if content is not None:
+                if keyword_found(content, keyword, content_type):
+                    return content
+                confirm = False
+        if len(body) >= MAX_CONTENT_BYTES:
+            break
+    return body.decode(encoding, errors="replace")
+
+def retry_delay(attempt, response=None):
+    # Honour Retry-After on throttling responses, otherwise capped exponential backoff with jitter
+    if response is not None and response.status_code in [429, 503]:
+        try:
+            return min(RETRY_BACKOFF_CAP, max(0.0, float(response.headers.get("Retry-After"))))
+        except (TypeError, ValueError):
+            pass
+    delay = RETRY_BACKOFF_BASE * 2 ** (attempt - 1) * random.uniform(1 - RETRY_JITTER, 1 + RETRY_JITTER)
+    return min(RETRY_BACKOFF_CAP, delay)
+
+def check_url(url, keyword=None, validators=None):
     verify_ssl = not is_internal_ip(url)
+    session = SESSION if verify_ssl else INTERNAL_SESSION
+    # Conditional GET: an unchanged page comes back as an empty 304
+    headers = {}
+    if validators and validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators and validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
     for attempt in range(1, RETRY_COUNT + 1):
+        response = None
         try:
             logging.info(f"Checking {url} (Attempt {attempt}/{RETRY_COUNT})")
-            print(f"[INFO] Checking {url} (Attempt {attempt}/{RETRY_COUNT})")
-            response = requests.get(url, timeout=TIMEOUT, verify=verify_ssl)
-            if response.status_code in [200, 401]:
-                return True, response.text
+            if not keyword:
+                # Reachability only needs the status code, not the body
+                response = session.head(url, timeout=TIMEOUT, verify=verify_ssl, allow_redirects=True)
+                if response.status_code in [200, 401]:
+                    return True, None, None
+            if keyword or response.status_code in [405, 501]:
+                with session.get(url, timeout=TIMEOUT, verify=verify_ssl, stream=True, headers=headers) as response:
+                    if response.status_code == 304 and headers:
+                        return True, NOT_MODIFIED, response.headers
+                    if response.status_code in [200, 401]:
+                        content = read_content(response, keyword) if keyword else None
+                        return True, content, response.headers
         except requests.RequestException as e:
             logging.warning(f"Failed attempt {attempt} for {url}: {e}")
-            print(f"[WARNING] {url} failed (Attempt {attempt})")
-    return False, None
+        if attempt < RETRY_COUNT:
+            time.sleep(retry_delay(attempt, response))
+    return False, None, None
 
-def keyword_found(content, keyword):
-    if not content or not keyword:
+def probe_url(url):
+    # Any sign of life, including redirects and rejected HEADs, counts as worth a full check
+    verify_ssl = not is_internal_ip(url)
+    session = SESSION if verify_ssl else INTERNAL_SESSION
+    try:
+        response = session.head(url, timeout=PROBE_TIMEOUT, verify=verify_ssl, allow_redirects=False)
+    except requests.RequestException:
         return False
-    keyword = keyword.lower()
-    soup = BeautifulSoup(content, "html.parser")
-    text_only = soup.get_text().lower()
-    return keyword in text_only
+    return response.status_code < 400 or response.status_code in [401, 405, 501]
+
+def is_markup(content_type):
+    # Without a Content-Type header, assume the page may contain tags
+    if not content_type:
+        return True
+    content_type = content_type.lower()
+    return "html" in content_type or "xml" in content_type
+
+def missing_keywords(content, keyword, content_type=None):
+    # Returns the configured keywords that do not appear in the page text
+    keywords = as_keywords(keyword) if keyword else []
+    if not content:
+        return keywords
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", errors="replace")
+    content = content.lower()
+    # JSON, plain text and other non-markup bodies are searched as-is
+    if not is_markup(content_type):
+        return [k for k in keywords if k.lower() not in content]
+    # Cheap reject before stripping markup: every word of a keyword must
+    # appear in the raw page unless entities could be hiding it
+    missing = []
+    candidates = []
+    for k in keywords:
+        if len(content) < len(k) or ("&" not in content and any(word not in content for word in k.lower().split())):
+            missing.append(k)
+        else:
+            candidates.append(k)
+    if candidates:
+        # Strip the markup once and test all remaining keywords against the same text
+        text_only = html.unescape(TAG_RE.sub("", content))
+        missing += [k for k in candidates if k.lower() not in text_only]
+    return [k for k in keywords if k in missing]
+
+def keyword_found(content, keyword, content_type=None):
+    return bool(keyword) and not missing_keywords(content, keyword, content_type)
 
 def notify_pushover(message):
     logging.info(f"NOTIFY: {message}")
-    print(f"[NOTIFY] {message}")
     try:
-        requests.post("https://api.pushover.net/1/messages.json", data={
+        SESSION.post("https://api.pushover.net/1/messages.json", data={
             "token": PUSHOVER_TOKEN,
             "user": PUSHOVER_USER,
             "message": message
-        })
+        }, timeout=TIMEOUT)
     except requests.RequestException as e:
         logging.error(f"Pushover notification failed: {e}")
-        print(f"[ERROR] Failed to send Pushover notification: {e}")
 
-def monitor():
-    failures = load_failures()
-    urls = load_urls()
+def batch_messages(messages, limit=PUSHOVER_MAX_LENGTH):
+    # Coalesce notifications into as few messages as the length limit allows
+    batch = ""
+    for message in messages:
+        if batch and len(batch) + 1 + len(message) > limit:
+            yield batch
+            batch = ""
+        batch = f"{batch}\n{message}" if batch else message
+    if batch:
+        yield batch
+
+def check_entry(entry, failures):
+    description = entry["description"]
+    url = entry["url"]
+    keyword = entry["keyword"]
 
-    for entry in urls:
+    # Validators are only reused while the cached keyword result matches this keyword
+    state = failures.get(url, {})
+    validators = None
+    if keyword and state.get("keyword") == keyword and "keyword_missing" in state:
+        validators = {"etag": state.get("etag"), "last_modified": state.get("last_modified")}
+
+    cache = {}
+    # A page that is down only because a keyword is missing still answers the probe;
+    # those rely on the conditional GET instead
+    if state.get("notified_down") and state.get("failures", 0) >= FAILURE_THRESHOLD and not state.get("keyword_missing"):
+        # Already reported down: a quick probe decides whether a full check is worth it,
+        # but a full check still runs every FULL_CHECK_INTERVAL seconds
+        if time.time() - state.get("last_full_check", 0) < FULL_CHECK_INTERVAL and not probe_url(url):
+            logging.info(f"{description} ({url}) still down, skipping full check.")
+            return entry, False, [], cache
+        cache["last_full_check"] = time.time()
+
+    logging.info(f"Checking {description} ({url})...")
+    reachable, content, headers = check_url(url, keyword, validators)
+    if content is NOT_MODIFIED:
+        keyword_missing = state["keyword_missing"]
+        if isinstance(keyword_missing, bool):
+            # State written before the missing keywords were recorded individually
+            keyword_missing = as_keywords(keyword) if keyword_missing else []
+        cache.update({
+            "etag": headers.get("ETag", state.get("etag")),
+            "last_modified": headers.get("Last-Modified", state.get("last_modified")),
+        })
+    else:
+        content_type = headers.get("Content-Type") if headers else None
+        keyword_missing = missing_keywords(content, keyword, content_type) if keyword and reachable else []
+        if keyword and reachable:
+            cache.update({"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")})
+    if keyword and reachable:
+        cache.update({"keyword": keyword, "keyword_missing": keyword_missing})
+    elif "keyword_missing" in state:
+        # The page is gone, so the old keyword result and validators no longer
+        # describe it; dropping them also re-enables the outage probe
+        cache.update({"keyword_missing": [], "etag": None, "last_modified": None})
+    return entry, reachable, keyword_missing, cache
+
+def process_results(results, failures):
+    pending = []
+    for entry, reachable, keyword_missing, cache in results:
         description = entry["description"]
         url = entry["url"]
-        keyword = entry["keyword"]
-
-        print(f"\n[INFO] Checking {description} ({url})...")
-        reachable, content = check_url(url)
-        keyword_missing = keyword and reachable and not keyword_found(content, keyword)
 
         if url not in failures:
             failures[url] = {"failures": 0, "notified_down": False, "notified_up": False}
+        failures[url].update(cache)
 
         failure_count = failures[url]["failures"]
         notified_down = failures[url]["notified_down"]
@@ -146,11 +451,11 @@ def monitor():
         if not reachable or keyword_missing:
             failure_count += 1
             logging.warning(f"{description} ({url}) failure count: {failure_count}/{FAILURE_THRESHOLD}")
-            print(f"[WARNING] {description} ({url}) failure count: {failure_count}/{FAILURE_THRESHOLD}")
 
             if failure_count >= FAILURE_THRESHOLD and not notified_down:
-                msg = f"❌ {description} ({url})" if not reachable else f"⚠️ {description} ({url}) MISSING '{keyword}'"
-                notify_pushover(msg)
+                missing = "', '".join(keyword_missing)
+                msg = f"❌ {description} ({url})" if not reachable else f"⚠️ {description} ({url}) MISSING '{missing}'"
+                pending.append(msg)
                 failures[url]["notified_down"] = True
                 failures[url]["notified_up"] = False
 
@@ -159,18 +464,80 @@ def monitor():
         else:
             if failure_count >= FAILURE_THRESHOLD and not notified_up:
                 logging.info(f"{description} ({url}) RECOVERED! Sending ✅ notification.")
-                print(f"[INFO] {description} ({url}) RECOVERED! Sending ✅ notification.")
-                notify_pushover(f"✅ {description} ({url})")
+                pending.append(f"✅ {description} ({url})")
                 failures[url]["notified_up"] = True
                 failures[url]["notified_down"] = False
 
             logging.info(f"{description} ({url}) is UP (Failures Reset).")
-            print(f"[INFO] {description} ({url}) is UP (Failures Reset).")
             failures[url]["failures"] = 0
 
+    return pending
+
+def set_workers(workers):
+    global MAX_WORKERS
+    MAX_WORKERS = workers
+    if workers > POOL_SIZE:
+        mount_adapters(workers)
+
+def monitor(failures=None, notifier=notify_pushover):
+    if failures is None:
+        failures = load_failures()
+    urls = load_urls()
+
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(urls)))) as executor:
+        # Checks run concurrently; failure bookkeeping stays single-threaded
+        results = list(executor.map(lambda entry: check_entry(entry, failures), urls))
+    pending = process_results(results, failures)
+
+    # Send after the scan so all notifications share one pooled connection
+    for message in batch_messages(pending):
+        notifier(message)
+
+    save_failures(failures)
+    return failures
+
+def run_daemon(interval):
+    # Keep failures and pooled connections warm between cycles
+    failures = load_failures()
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        # No logging here: the handler can interrupt the main thread while it holds
+        # the log queue's lock, and logging again would deadlock on it
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    monitor(failures)
+    while not stop_event.wait(interval):
+        monitor(failures)
+    logging.info("Received stop signal, shutting down.")
     save_failures(failures)
 
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Monitor URLs and send Pushover notifications.")
+    parser.add_argument("--daemon", action="store_true", help="keep running and check URLs every --interval seconds")
+    parser.add_argument("--interval", type=positive_int, default=60, help="seconds between checks in daemon mode (default: 60)")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help=f"number of URLs checked concurrently (default: {MAX_WORKERS})")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    print("\n[INFO] Starting URL monitor...\n")
-    monitor()
-    print("\n[INFO] Monitoring completed.\n")
+    args = parse_args()
+    set_workers(max(1, args.workers))
+    logging.info("Starting URL monitor...")
+    try:
+        if args.daemon:
+            run_daemon(args.interval)
+        else:
+            monitor()
+    finally:
+        SESSION.close()
+        INTERNAL_SESSION.close()
+    logging.info("Monitoring completed.")